@@ -0,0 +1,167 @@
+"""
+Admission control module for the AI Test System.
+This module limits how much expensive work runs at once, lets interactive
+requests jump ahead of bulk ones, shares capacity fairly between tenants and
+rejects requests quickly when the queue is full.
+"""
+
+import os
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+from fastapi import HTTPException
+
+# Priority classes, lower runs first
+INTERACTIVE = 0
+BULK = 1
+
+class EndpointPolicy:
+    """Concurrency limit, queue bound and priority class for one endpoint."""
+
+    def __init__(self, limit: int, queue_size: int, priority: int = INTERACTIVE):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.priority = priority
+
+class _Waiter:
+    def __init__(self, endpoint: str, tenant: str, priority: int, seq: int):
+        self.endpoint = endpoint
+        self.tenant = tenant
+        self.priority = priority
+        self.seq = seq
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+class Slot:
+    """A granted unit of capacity; pass it back to release()."""
+
+    def __init__(self, endpoint: str, tenant: str):
+        self.endpoint = endpoint
+        self.tenant = tenant
+        self.released = False
+
+class AdmissionController:
+    """Priority- and tenant-aware admission control shared by all endpoints."""
+
+    def __init__(self, policies: Dict[str, EndpointPolicy], max_concurrency: Optional[int] = None,
+                 tenant_limit: Optional[int] = None, queue_timeout: Optional[float] = None):
+        self.policies = policies
+        self.max_concurrency = max_concurrency or int(os.getenv("ADMISSION_MAX_CONCURRENCY", "8"))
+        self.tenant_limit = tenant_limit or int(os.getenv("ADMISSION_TENANT_LIMIT", "4"))
+        self.queue_timeout = queue_timeout or float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "30"))
+
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self.active = 0
+        self.endpoint_active: Dict[str, int] = {name: 0 for name in policies}
+        self.tenant_active: Dict[str, int] = {}
+        self.rejected = {"queueFull": 0, "queueTimeout": 0}
+
+    def _eligible(self, waiter: _Waiter) -> bool:
+        policy = self.policies[waiter.endpoint]
+        return (
+            self.endpoint_active[waiter.endpoint] < policy.limit
+            and self.tenant_active.get(waiter.tenant, 0) < self.tenant_limit
+        )
+
+    def _dispatch(self) -> None:
+        # Grant free capacity to the best eligible waiters: interactive before
+        # bulk, then the tenant with the least work running, then arrival order
+        while self.active < self.max_concurrency:
+            candidates = [w for w in self._waiters if not w.future.done() and self._eligible(w)]
+            if not candidates:
+                break
+            waiter = min(candidates, key=lambda w: (w.priority, self.tenant_active.get(w.tenant, 0), w.seq))
+            self._waiters.remove(waiter)
+            self._grant(waiter.endpoint, waiter.tenant)
+            waiter.future.set_result(Slot(waiter.endpoint, waiter.tenant))
+
+    def _grant(self, endpoint: str, tenant: str) -> None:
+        self.active += 1
+        self.endpoint_active[endpoint] += 1
+        self.tenant_active[tenant] = self.tenant_active.get(tenant, 0) + 1
+
+    async def acquire(self, endpoint: str, tenant: str = "anonymous") -> Slot:
+        """
+        Wait for capacity to run a request.
+
+        Args:
+            endpoint: Name of a configured EndpointPolicy
+            tenant: Teacher or subject the request is billed to
+
+        Returns:
+            Slot to hand back to release() when the work is done
+
+        Raises:
+            HTTPException: 429 if the endpoint's queue is full, 503 if the wait times out
+        """
+        policy = self.policies[endpoint]
+        queued = sum(1 for w in self._waiters if w.endpoint == endpoint)
+        if queued >= policy.queue_size:
+            self.rejected["queueFull"] += 1
+            raise HTTPException(status_code=429, detail=f"Too many queued {endpoint} requests, retry later",
+                                headers={"Retry-After": "5"})
+
+        waiter = _Waiter(endpoint, tenant, policy.priority, next(self._seq))
+        self._waiters.append(waiter)
+        self._dispatch()
+
+        try:
+            done, _ = await asyncio.wait([waiter.future], timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+
+        if not done:
+            self._abandon(waiter)
+            self.rejected["queueTimeout"] += 1
+            raise HTTPException(status_code=503, detail=f"Server overloaded, {endpoint} request timed out in queue",
+                                headers={"Retry-After": "10"})
+        return waiter.future.result()
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        if waiter.future.done() and not waiter.future.cancelled():
+            # Capacity was granted just as the caller gave up
+            self.release(waiter.future.result())
+            return
+        waiter.future.cancel()
+        if waiter in self._waiters:
+            self._waiters.remove(waiter)
+
+    def release(self, slot: Slot) -> None:
+        """Return a slot's capacity and wake the next waiter."""
+        if slot.released:
+            return
+        slot.released = True
+        self.active -= 1
+        self.endpoint_active[slot.endpoint] -= 1
+        self.tenant_active[slot.tenant] -= 1
+        if not self.tenant_active[slot.tenant]:
+            del self.tenant_active[slot.tenant]
+        self._dispatch()
+
+    @asynccontextmanager
+    async def admit(self, endpoint: str, tenant: str = "anonymous"):
+        """Hold a slot for the duration of a block."""
+        slot = await self.acquire(endpoint, tenant)
+        try:
+            yield slot
+        finally:
+            self.release(slot)
+
+    def stats(self) -> Dict[str, object]:
+        """Get current load and rejection counters."""
+        return {
+            "active": self.active,
+            "maxConcurrency": self.max_concurrency,
+            "queued": len(self._waiters),
+            "endpoints": {
+                name: {
+                    "active": self.endpoint_active[name],
+                    "limit": policy.limit,
+                    "queued": sum(1 for w in self._waiters if w.endpoint == name)
+                }
+                for name, policy in self.policies.items()
+            },
+            "rejected": dict(self.rejected)
+        }
@@ -0,0 +1,271 @@
+"""
+Chunk retrieval module for the AI Test System.
+This module builds a per-document TF-IDF index over text chunks so that
+generation can target only the chunks relevant to the teacher's remarks and
+grading can quote only the material relevant to each question.
+
+Each stored document has one persisted index, which records the pages every
+chunk spans; page ranges filter that index instead of getting their own.
+Inline text is indexed in memory only.
+"""
+
+import os
+import re
+import bisect
+import tempfile
+from typing import Callable, Iterable, List, Optional, Tuple
+import joblib
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import linear_kernel
+from document_store import DOCUMENTS_DIR, DOCUMENT_ID_PATTERN, PAGE_SEPARATOR, join_pages
+
+# Minimum cosine similarity for a chunk to count as relevant to a topic
+TOPIC_MIN_SIMILARITY = 0.05
+
+# Free-form remarks only narrow generation when they clearly name the material
+REMARK_MIN_SIMILARITY = 0.1
+
+# Words that describe how to write questions rather than what they are about
+INSTRUCTION_WORDS = {
+    "generate", "create", "make", "write", "give", "prepare", "ask", "set", "frame",
+    "question", "questions", "answer", "answers", "mcq", "mcqs", "quiz", "test", "exam",
+    "hard", "easy", "medium", "difficult", "simple", "tough", "challenging", "basic", "advanced",
+    "short", "long", "brief", "detailed", "numerical", "conceptual", "theory", "theoretical",
+    "class", "grade", "level", "standard", "student", "students", "marks", "mark",
+    "focus", "focusing", "please", "include", "only", "mostly", "more", "less", "few", "many",
+    "based", "chapter", "chapters", "topic", "topics", "section", "unit", "syllabus", "material",
+}
+
+def remark_query(remark: str) -> str:
+    """Strip instruction words and numbers from a teacher remark, keeping its subject matter."""
+    words = re.findall(r"[A-Za-z][A-Za-z'-]*", remark or "")
+    return " ".join(word for word in words if word.lower() not in INSTRUCTION_WORDS)
+
+# Longest excerpt quoted from the source when grading one answer
+EXCERPT_MAX_CHARS = 4000
+
+def index_path(document_id: str, base_dir: str = DOCUMENTS_DIR) -> str:
+    """
+    Get the path of the chunk index stored next to a document.
+
+    Args:
+        document_id: Document id from save_document()
+        base_dir: Directory holding stored documents
+
+    Returns:
+        Path of the persisted index
+    """
+    if not DOCUMENT_ID_PATTERN.match(document_id or ""):
+        raise KeyError(f"Invalid document id: {document_id}")
+    return os.path.join(base_dir, f"{document_id}.index")
+
+def chunk_pages(pages: List[str], chunks: List[str]) -> List[Tuple[int, int]]:
+    """
+    Find the pages each chunk of a document spans.
+
+    Args:
+        pages: Text of each page in order
+        chunks: Chunks split from join_pages(pages), in order
+
+    Returns:
+        First and last page (1-based) of each chunk
+    """
+    joined = PAGE_SEPARATOR.join(pages)
+    # join_pages() strips leading whitespace, which shifts every offset
+    lead = len(joined) - len(joined.lstrip())
+    text = join_pages(pages)
+    starts, position = [], -lead
+    for page in pages:
+        starts.append(position)
+        position += len(page) + len(PAGE_SEPARATOR)
+
+    spans, cursor = [], 0
+    for chunk in chunks:
+        found = text.find(chunk, cursor)
+        if found < 0:
+            found = text.find(chunk)
+        if found < 0:
+            # Not a verbatim slice of the text; treat it as spanning everything
+            spans.append((1, len(pages)))
+            continue
+        first = bisect.bisect_right(starts, found)
+        last = bisect.bisect_right(starts, found + max(len(chunk) - 1, 0))
+        spans.append((max(first, 1), max(last, 1)))
+        # Chunks overlap, so the next one may start inside this one
+        cursor = found + 1
+    return spans
+
+class ChunkIndex:
+    """TF-IDF index over the chunks of a single document."""
+
+    def __init__(self, chunks: List[str], pages: Optional[List[Tuple[int, int]]] = None):
+        self.chunks = chunks
+        # First and last page of each chunk, for indexes of stored documents
+        self.pages = pages
+        self.vectorizer = TfidfVectorizer(stop_words="english", sublinear_tf=True)
+        try:
+            self.matrix = self.vectorizer.fit_transform(chunks)
+        except ValueError:
+            # Chunks contain only stop words or no words at all
+            self.matrix = None
+
+    def in_pages(self, page_start: Optional[int] = None, page_end: Optional[int] = None) -> List[int]:
+        """
+        Find the chunks that overlap a page range.
+
+        Args:
+            page_start: First page of the range, 1-based (defaults to the first page)
+            page_end: Last page of the range, inclusive (defaults to the last page)
+
+        Returns:
+            Indices of the chunks in document order; all chunks if pages are unknown
+        """
+        if self.pages is None or (page_start is None and page_end is None):
+            return list(range(len(self.chunks)))
+        start = page_start or 1
+        return [
+            i for i, (first, last) in enumerate(self.pages)
+            if last >= start and (page_end is None or first <= page_end)
+        ]
+
+    def search(self, query: str, top_k: int = 5, min_score: float = TOPIC_MIN_SIMILARITY,
+               candidates: Optional[Iterable[int]] = None) -> List[int]:
+        """
+        Find the chunks most relevant to a query.
+
+        Args:
+            query: Free-text query (teacher remarks, topics)
+            top_k: Maximum number of chunks to return
+            min_score: Minimum cosine similarity for a chunk to count as a match
+            candidates: Only consider these chunk indices (defaults to all chunks)
+
+        Returns:
+            Indices of matching chunks in document order; empty if nothing matches
+        """
+        if self.matrix is None or not query.strip():
+            return []
+
+        rows = list(range(len(self.chunks))) if candidates is None else list(candidates)
+        if not rows:
+            return []
+        query_vector = self.vectorizer.transform([query])
+        scores = linear_kernel(query_vector, self.matrix[rows]).ravel()
+
+        ranked = scores.argsort()[::-1][:top_k]
+        # Keep document order so the LLM sees the material as it was written
+        return sorted(rows[i] for i in ranked if scores[i] >= min_score)
+
+    def excerpt(self, query: str, max_chars: int = EXCERPT_MAX_CHARS,
+                candidates: Optional[List[int]] = None) -> str:
+        """
+        Quote the chunks most relevant to a query.
+
+        Args:
+            query: Free-text query (question and model answer)
+            max_chars: Maximum length of the excerpt
+            candidates: Only quote these chunk indices (defaults to all chunks)
+
+        Returns:
+            Matching chunks in document order, or an empty string if nothing matches
+        """
+        rows = list(range(len(self.chunks))) if candidates is None else candidates
+        if not rows:
+            return ""
+        # Ask for about as many chunks as fit in the excerpt
+        average = max(1, sum(len(self.chunks[i]) for i in rows) // len(rows))
+        matches = self.search(query, max(1, max_chars // average), candidates=rows)
+        return "\n\n".join(self.chunks[i] for i in matches)[:max_chars]
+
+    def save(self, path: str) -> None:
+        """Persist the index to disk atomically."""
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                joblib.dump(self, f)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    @staticmethod
+    def load(path: str) -> "ChunkIndex":
+        """Load an index previously written with save()."""
+        return joblib.load(path)
+
+def get_chunk_index(document_id: str, load_pages: Callable[[], List[str]],
+                    split: Callable[[str], List[str]], base_dir: str = DOCUMENTS_DIR) -> ChunkIndex:
+    """
+    Load the chunk index for a stored document, building and persisting it if needed.
+
+    Args:
+        document_id: Document id from save_document()
+        load_pages: Returns the document's pages; only called when no index is stored
+        split: Splits the joined text into chunks, the same way generation does
+        base_dir: Directory holding stored documents
+
+    Returns:
+        ChunkIndex over the whole document, with the pages of each chunk
+    """
+    path = index_path(document_id, base_dir)
+    if os.path.exists(path):
+        try:
+            index = ChunkIndex.load(path)
+            # Document ids are content hashes, so only the format can be out of date
+            if getattr(index, "pages", None) is not None:
+                return index
+        except Exception as e:
+            print(f"Error loading chunk index, rebuilding: {e}")
+
+    pages = load_pages()
+    chunks = split(join_pages(pages))
+    index = ChunkIndex(chunks, chunk_pages(pages, chunks))
+    try:
+        index.save(path)
+    except OSError as e:
+        print(f"Error persisting chunk index: {e}")
+
+    return index
+
+def select_relevant_chunks(chunks: List[str], teacher_remarks: str = "",
+                           topics: Optional[List[str]] = None, top_k: Optional[int] = None,
+                           index: Optional[ChunkIndex] = None,
+                           candidates: Optional[List[int]] = None) -> List[str]:
+    """
+    Narrow a document's chunks to those relevant to the requested material.
+
+    Explicit topics are always searched. The teacher remark is only used when,
+    after dropping instruction words ("generate hard questions for class 10"),
+    it still matches some chunk strongly; otherwise the whole document is used.
+
+    Args:
+        chunks: Chunks of the requested material
+        teacher_remarks: Free-form guidance from the teacher
+        topics: Topics to focus on, searched separately
+        top_k: Maximum number of chunks to keep (defaults to 5)
+        index: Stored index the chunks come from; inline text is indexed in memory
+        candidates: Indices of the chunks in index.chunks, when index is given
+
+    Returns:
+        Relevant chunks in document order, or all chunks if nothing matches
+    """
+    top_k = top_k or 5
+    queries = [(topic, TOPIC_MIN_SIMILARITY) for topic in topics or [] if topic and topic.strip()]
+    remark = remark_query(teacher_remarks)
+    if not queries and remark:
+        queries = [(remark, REMARK_MIN_SIMILARITY)]
+    if not queries or len(chunks) <= top_k:
+        return chunks
+
+    if index is None:
+        index, candidates = ChunkIndex(chunks), None
+
+    # Split the budget across queries so every requested topic gets coverage
+    per_query = max(1, top_k // len(queries))
+    matches = set()
+    for query, min_score in queries:
+        matches.update(index.search(query, per_query, min_score, candidates))
+
+    return [index.chunks[i] for i in sorted(matches)[:top_k]] if matches else chunks
@@ -15,13 +15,17 @@ load_dotenv()
 # Initialize OpenAI API if available
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
-def compare_answers(student_answer: str, ai_answer: str) -> Dict[str, Any]:
+# Longest source excerpt included in a grading prompt
+MAX_CONTEXT_CHARS = 6000
+
+def compare_answers(student_answer: str, ai_answer: str, context: str = "") -> Dict[str, Any]:
     """
     Compare a student's answer with the AI-generated answer.
     
     Args:
         student_answer: The student's answer
         ai_answer: The AI-generated correct answer
+        context: Optional source material the question was drawn from
         
     Returns:
         Dictionary containing similarity score, feedback, and suggested score
@@ -45,10 +49,14 @@ def compare_answers(student_answer: str, ai_answer: str) -> Dict[str, Any]:
         }
     
     try:
+        source_material = f'Source material: "{context[:MAX_CONTEXT_CHARS]}"' if context else ""
+        
         # Prepare the prompt for comparison
         prompt = f"""
         I need to compare a student's answer with a correct answer and evaluate it.
         
+        {source_material}
+        
         Correct answer: "{ai_answer}"
         
         Student answer: "{student_answer}"
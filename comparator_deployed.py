@@ -1,7 +1,22 @@
 import streamlit as st
 import json
+import os
+import re
 import ollama
 import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from serialization import dumps
+
+MAX_PARALLELISM = 32
+
+def default_parallelism():
+    try:
+        value = int(os.getenv("OLLAMA_MAX_PARALLEL", "4"))
+    except ValueError:
+        value = 4
+    return min(max(value, 1), MAX_PARALLELISM)
+
+DEFAULT_PARALLELISM = default_parallelism()
 
 def load_qna(file, key):
     try:
@@ -63,23 +78,76 @@ def evaluate_answer(question, ai_answer, student_answer, key):
         }
     return result
 
-def evaluate_qna(ai_qna, student_qna):
-    evaluation_results = []
-    for index, (ai_entry, student_entry) in enumerate(zip(ai_qna, student_qna)):
-        if ai_entry.get("question") != student_entry.get("question"):
-            st.warning(f"Mismatched question detected: {ai_entry.get('question')}")
+def normalize_question(question):
+    # Ignore case, spacing and trailing punctuation when matching questions
+    return re.sub(r"\s+", " ", str(question or "")).strip().rstrip("?.!:").strip().lower()
+
+def align_qna(ai_qna, student_qna):
+    student_index = {}
+    for student_entry in student_qna:
+        student_index.setdefault(normalize_question(student_entry.get("question")), student_entry)
+
+    aligned = []
+    matched = set()
+    for ai_entry in ai_qna:
+        key = normalize_question(ai_entry.get("question"))
+        student_entry = student_index.get(key)
+        if student_entry is None:
+            st.warning(f"No student answer for question: {ai_entry.get('question')}")
             continue
-        
-        question = ai_entry["question"]
-        ai_answer = ai_entry["answer"]
-        student_answer = student_entry["answer"]
-        evaluation = evaluate_answer(question, ai_answer, student_answer, key=f"evaluation_{index}")
-        evaluation["question"] = question
-        evaluation["student_answer"] = student_answer
-        evaluation["ai_answer"] = ai_answer
-        evaluation_results.append(evaluation)
+        matched.add(key)
+        aligned.append((ai_entry["question"], ai_entry["answer"], student_entry.get("answer", "")))
+
+    for key, student_entry in student_index.items():
+        if key not in matched:
+            st.warning(f"Mismatched question detected: {student_entry.get('question')}")
+    return aligned
+
+def iter_evaluations(aligned, max_workers=DEFAULT_PARALLELISM):
+    # Yields (position, evaluation) in completion order
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+    try:
+        futures = {
+            executor.submit(evaluate_answer, question, ai_answer, student_answer, key=f"evaluation_{index}"): index
+            for index, (question, ai_answer, student_answer) in enumerate(aligned)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            question, ai_answer, student_answer = aligned[index]
+            evaluation = future.result()
+            evaluation["question"] = question
+            evaluation["student_answer"] = student_answer
+            evaluation["ai_answer"] = ai_answer
+            yield index, evaluation
+    except BaseException:
+        # Fail fast: drop queued Ollama calls instead of waiting for all of them
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown()
+
+def evaluate_qna(ai_qna, student_qna, max_workers=DEFAULT_PARALLELISM, on_result=None):
+    # on_result(done, total, position, evaluation) is called as each evaluation completes
+    aligned = align_qna(ai_qna, student_qna)
+    evaluation_results = [None] * len(aligned)
+    for done, (index, evaluation) in enumerate(iter_evaluations(aligned, max_workers), start=1):
+        evaluation_results[index] = evaluation
+        if on_result:
+            on_result(done, len(aligned), index, evaluation)
     return evaluation_results
 
+def render_result(position, result):
+    with st.expander(f"Question {position}: {result['question']}"):
+        st.write(f"**AI Answer:** {result['ai_answer']}")
+        st.write(f"**Student Answer:** {result['student_answer']}")
+        st.write(f"**Accuracy:** {result['accuracy']}/10")
+        st.write(f"**Context Understanding:** {result['context']}/10")
+        st.write(f"**Relevance:** {result['relevance']}/10")
+        st.write(f"**Completeness:** {result['completeness']}/10")
+        st.write(f"**Coherence & Grammar:** {result['coherence']}/10")
+        st.write(f"**Overall Score:** {result['overall_score']}/10")
+        st.write(f"**Rote Learning:** {result['rote_learning']}")
+        st.write(f"**Improvement Suggestions:** {result['improvement_suggestions']}")
+
 
 st.title("QnA Answer Evaluator")
 st.write("Upload two JSON files: One with AI-generated answers and another with student answers.")
@@ -93,35 +161,32 @@ if ai_file and student_file:
     student_qna = load_qna(student_file, "Student QnA File")
     
     if ai_qna and student_qna:
+        max_workers = st.number_input(
+            "Parallel evaluations", min_value=1, max_value=MAX_PARALLELISM, value=DEFAULT_PARALLELISM, key="max_workers"
+        )
         if st.button("Run Evaluation", key="run_evaluation"):
-            with st.spinner("Evaluating answers..."):
-                results = evaluate_qna(ai_qna, student_qna)
+            progress = st.progress(0.0, text="Evaluating answers...")
 
-               
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".json", mode="w", encoding="utf-8") as temp_file:
-                    json.dump(results, temp_file, indent=4)  # Write as string
+            def show_result(done, total, index, evaluation):
+                # Show each evaluation as soon as Ollama returns it
+                render_result(index + 1, evaluation)
+                progress.progress(done / total, text=f"Evaluated {done}/{total} answers")
+
+            results = evaluate_qna(ai_qna, student_qna, int(max_workers), on_result=show_result)
+
+            if results:
+                # Serialize once and reuse the bytes for the file and the download
+                payload = dumps(results, indent=True)
+                with tempfile.NamedTemporaryFile(delete=False, suffix=".json", mode="wb") as temp_file:
+                    temp_file.write(payload)
                     temp_filename = temp_file.name
-                
-                st.success("Evaluation completed!")
 
-               
-                for i, result in enumerate(results):
-                    with st.expander(f"Question {i+1}: {result['question']}"):
-                        st.write(f"**AI Answer:** {result['ai_answer']}")
-                        st.write(f"**Student Answer:** {result['student_answer']}")
-                        st.write(f"**Accuracy:** {result['accuracy']}/10")
-                        st.write(f"**Context Understanding:** {result['context']}/10")
-                        st.write(f"**Relevance:** {result['relevance']}/10")
-                        st.write(f"**Completeness:** {result['completeness']}/10")
-                        st.write(f"**Coherence & Grammar:** {result['coherence']}/10")
-                        st.write(f"**Overall Score:** {result['overall_score']}/10")
-                        st.write(f"**Rote Learning:** {result['rote_learning']}")
-                        st.write(f"**Improvement Suggestions:** {result['improvement_suggestions']}")
+                st.success("Evaluation completed!")
 
 
                 st.download_button(
                     label="Download Evaluation JSON",
-                    data=json.dumps(results, indent=4).encode("utf-8"),  # Encode before download
+                    data=payload,
                     file_name="evaluation_results.json",
                     mime="application/json",
                     key="download_button"
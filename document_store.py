@@ -0,0 +1,188 @@
+"""
+Document storage module for the AI Test System.
+This module keeps extracted text on the server, compressed page by page with
+an offset index, so clients can refer to a document by id and any page range
+can be read through a memory map without decompressing the whole document.
+"""
+
+import os
+import re
+import json
+import mmap
+import zlib
+import hashlib
+import tempfile
+from typing import List, Optional, Tuple
+
+# Stored documents (and their chunk indexes) live in this directory
+DOCUMENTS_DIR = os.path.join("data", "documents")
+
+PAGE_SEPARATOR = "\n\n"
+DOCUMENT_ID_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+def document_hash(text: str) -> str:
+    """
+    Compute a stable identifier for a document's text.
+
+    Args:
+        text: Extracted document text
+
+    Returns:
+        Hex SHA-256 digest of the text
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def join_pages(pages: List[str]) -> str:
+    """Join page texts the same way extract_text_from_pdf() does."""
+    return PAGE_SEPARATOR.join(pages).strip()
+
+def _paths(document_id: str, base_dir: str) -> Tuple[str, str]:
+    if not DOCUMENT_ID_PATTERN.match(document_id or ""):
+        raise KeyError(f"Invalid document id: {document_id}")
+    prefix = os.path.join(base_dir, document_id)
+    return prefix + ".pages", prefix + ".pages.json"
+
+def save_document(pages: List[str], base_dir: str = DOCUMENTS_DIR) -> str:
+    """
+    Store a document's pages compressed, one zlib frame per page.
+
+    Args:
+        pages: Text of each page in order
+        base_dir: Directory holding stored documents
+
+    Returns:
+        Document id (hash of the joined text); saving the same text again is a no-op
+    """
+    document_id = document_hash(join_pages(pages))
+    data_path, index_path = _paths(document_id, base_dir)
+    if os.path.exists(index_path):
+        return document_id
+
+    os.makedirs(base_dir, exist_ok=True)
+    # Unique temp files: several threads may store the same upload at once
+    data_fd, data_temp = tempfile.mkstemp(dir=base_dir, suffix=".tmp")
+    index_fd, index_temp = tempfile.mkstemp(dir=base_dir, suffix=".tmp")
+    try:
+        offsets = []
+        with os.fdopen(data_fd, "wb") as f:
+            position = 0
+            for page in pages:
+                frame = zlib.compress(page.encode("utf-8"), 6)
+                f.write(frame)
+                offsets.append([position, len(frame)])
+                position += len(frame)
+        with os.fdopen(index_fd, "w", encoding="utf-8") as f:
+            json.dump({"pages": offsets}, f)
+
+        # Publish the data before the index so readers never see a partial document
+        os.replace(data_temp, data_path)
+        os.replace(index_temp, index_path)
+    except FileNotFoundError:
+        # Lost a race with another writer storing the same content
+        if not os.path.exists(index_path):
+            raise
+    finally:
+        for temp_path in (data_temp, index_temp):
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    return document_id
+
+def document_exists(document_id: str, base_dir: str = DOCUMENTS_DIR) -> bool:
+    """Check whether a document id refers to a stored document."""
+    try:
+        return os.path.exists(_paths(document_id, base_dir)[1])
+    except KeyError:
+        return False
+
+def page_count(document_id: str, base_dir: str = DOCUMENTS_DIR) -> int:
+    """Get the number of pages in a stored document."""
+    return len(_load_offsets(document_id, base_dir))
+
+def _load_offsets(document_id: str, base_dir: str) -> List[List[int]]:
+    _, index_path = _paths(document_id, base_dir)
+    if not os.path.exists(index_path):
+        raise KeyError(f"Document not found: {document_id}")
+    with open(index_path, "r", encoding="utf-8") as f:
+        return json.load(f)["pages"]
+
+def _check_range(offsets: List[List[int]], page_start: Optional[int],
+                 page_end: Optional[int]) -> Tuple[int, int]:
+    start = 1 if page_start is None else page_start
+    end = len(offsets) if page_end is None else page_end
+    if start < 1 or end > len(offsets) or start > end:
+        raise ValueError(f"Page range {start}-{end} is outside 1-{len(offsets)}")
+    return start, end
+
+def check_page_range(document_id: str, page_start: Optional[int] = None, page_end: Optional[int] = None,
+                     base_dir: str = DOCUMENTS_DIR) -> Tuple[int, int]:
+    """
+    Validate a page range of a stored document without reading its text.
+
+    Args:
+        document_id: Id returned by save_document()
+        page_start: First page, 1-based (defaults to the first page)
+        page_end: Last page, inclusive (defaults to the last page)
+        base_dir: Directory holding stored documents
+
+    Returns:
+        The range as (first page, last page); (1, 0) for a document without pages
+
+    Raises:
+        KeyError: If the document does not exist
+        ValueError: If the page range is out of bounds
+    """
+    offsets = _load_offsets(document_id, base_dir)
+    if not offsets:
+        return 1, 0
+    return _check_range(offsets, page_start, page_end)
+
+def load_pages(document_id: str, page_start: Optional[int] = None, page_end: Optional[int] = None,
+               base_dir: str = DOCUMENTS_DIR) -> List[str]:
+    """
+    Read the text of each page in a range of a stored document.
+
+    Args:
+        document_id: Id returned by save_document()
+        page_start: First page to read, 1-based (defaults to the first page)
+        page_end: Last page to read, inclusive (defaults to the last page)
+        base_dir: Directory holding stored documents
+
+    Returns:
+        Text of each requested page in order
+
+    Raises:
+        KeyError: If the document does not exist
+        ValueError: If the page range is out of bounds
+    """
+    offsets = _load_offsets(document_id, base_dir)
+    if not offsets:
+        return []
+    start, end = _check_range(offsets, page_start, page_end)
+
+    data_path, _ = _paths(document_id, base_dir)
+    with open(data_path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return [
+                zlib.decompress(mapped[offset:offset + length]).decode("utf-8")
+                for offset, length in offsets[start - 1:end]
+            ]
+
+def load_text(document_id: str, page_start: Optional[int] = None, page_end: Optional[int] = None,
+              base_dir: str = DOCUMENTS_DIR) -> str:
+    """
+    Read the text of a stored document or a range of its pages.
+
+    Args:
+        document_id: Id returned by save_document()
+        page_start: First page to read, 1-based (defaults to the first page)
+        page_end: Last page to read, inclusive (defaults to the last page)
+        base_dir: Directory holding stored documents
+
+    Returns:
+        Text of the requested pages joined like extract_text_from_pdf()
+
+    Raises:
+        KeyError: If the document does not exist
+        ValueError: If the page range is out of bounds
+    """
+    return join_pages(load_pages(document_id, page_start, page_end, base_dir))
@@ -1,19 +1,30 @@
 
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Body
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Body, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, FileResponse, JSONResponse
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, TypedDict
 import os
 import json
+import tempfile
 import uvicorn
 from dotenv import load_dotenv
+from serialization import NDJSON_MEDIA_TYPE, aiter_ndjson, dumps
+from starlette.concurrency import run_in_threadpool
+from singleflight import SingleFlight, make_key, normalize_text
+from admission import AdmissionController, EndpointPolicy, INTERACTIVE, BULK
+import profiling
+from profiling import ProfilingMiddleware, profiled
+from question_bank import QuestionBank
+from document_store import save_document, load_pages, check_page_range, document_hash, join_pages
+from chunk_index import ChunkIndex, get_chunk_index
 
 # Import our Python modules
 # These imports assume your Python files are in the same directory
 # Adjust imports based on your actual file structure
 try:
-    from text_extractor import extract_text_from_pdf
-    from qna_extractor import generate_qna_pairs
+    from text_extractor import extract_text_from_pdf, extract_pages_from_pdf
+    from qna_extractor import generate_qna_pairs, document_chunks
     from comparator import compare_answers
 except ImportError as e:
     print(f"Error importing Python modules: {e}")
@@ -22,13 +33,20 @@ except ImportError as e:
     def extract_text_from_pdf(file_path):
         return "Sample extracted text for development"
     
-    def generate_qna_pairs(text, teacher_remarks=""):
+    def extract_pages_from_pdf(file_path):
+        return ["Sample extracted text for development"]
+    
+    def generate_qna_pairs(text, teacher_remarks="", num_questions=10, topics=None, top_k=None, document_key=None,
+                           index=None, page_start=None, page_end=None):
         return [
             {"question": "Sample Question 1?", "answer": "Sample Answer 1"},
             {"question": "Sample Question 2?", "answer": "Sample Answer 2"}
         ]
     
-    def compare_answers(student_answer, ai_answer):
+    def document_chunks(text):
+        return [text]
+    
+    def compare_answers(student_answer, ai_answer, context=""):
         return {
             "similarity": 85,
             "feedback": "This is sample feedback",
@@ -38,7 +56,13 @@ except ImportError as e:
 # Load environment variables
 load_dotenv()
 
-app = FastAPI(title="AI Test System Backend")
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with the fast encoder instead of json.dumps"""
+    
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+app = FastAPI(title="AI Test System Backend", default_response_class=FastJSONResponse)
 
 # Configure CORS
 app.add_middleware(
@@ -47,21 +71,57 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Profile-Id"],
 )
 
+# Opt-in per-request CPU and allocation profiling (X-Profile: $PROFILING_TOKEN or admin sampling)
+app.add_middleware(ProfilingMiddleware)
+
+# Identical concurrent generation and grading requests share one computation
+generation_flight = SingleFlight("generation")
+grading_flight = SingleFlight("grading")
+index_flight = SingleFlight("chunk-index")
+
+# Interactive endpoints get most of the capacity; bulk grading is capped so it
+# cannot starve them
+admission = AdmissionController({
+    "extract-text": EndpointPolicy(limit=4, queue_size=16, priority=INTERACTIVE),
+    "generate-qna": EndpointPolicy(limit=4, queue_size=16, priority=INTERACTIVE),
+    "compare-answers": EndpointPolicy(limit=4, queue_size=32, priority=INTERACTIVE),
+    "compare-answers-bulk": EndpointPolicy(limit=2, queue_size=8, priority=BULK),
+})
+
+# Index over every saved Q&A set, reused before asking the LLM for new questions
+question_bank = QuestionBank()
+
+def tenant_of(request: Request) -> str:
+    """Identify who a request is billed to for fair sharing"""
+    return (
+        request.headers.get("x-teacher-id")
+        or request.headers.get("x-subject-id")
+        or (request.client.host if request.client else "anonymous")
+    )
+
 # Pydantic models
 class QnAPair(BaseModel):
     question: str
     answer: str
+    difficulty: Optional[str] = None
+    topics: Optional[List[str]] = None
+    # Source material, so the bank only reuses the pair for the same document
+    documentId: Optional[str] = None
+    pageStart: Optional[int] = None
+    pageEnd: Optional[int] = None
 
-class TestAnalysis(BaseModel):
+# Result records are plain dicts so they serialize without pydantic overhead
+class TestAnalysis(TypedDict):
     studentAnswer: str
     aiAnswer: str
     similarity: float
     feedback: str
     suggestedScore: float
 
-class TestResult(BaseModel):
+class TestResult(TypedDict):
     questionId: int
     questionText: str
     studentAnswer: str
@@ -69,85 +129,310 @@ class TestResult(BaseModel):
     marks: float
     totalMarks: float
 
+class ProfilingSettings(BaseModel):
+    sampleRate: float
+
 class QnARequest(BaseModel):
-    text: str
+    # Either raw text or a documentId from /api/extract-text (optionally a page range)
+    text: Optional[str] = None
+    documentId: Optional[str] = None
+    pageStart: Optional[int] = None
+    pageEnd: Optional[int] = None
     teacherRemark: Optional[str] = ""
+    numQuestions: int = 10
+    topics: Optional[List[str]] = None
+    topK: Optional[int] = None
+    documentKey: Optional[str] = None
+    subjectId: Optional[str] = None
+    difficulty: Optional[str] = None
+    useQuestionBank: bool = True
 
 class CompareRequest(BaseModel):
     studentAnswers: List[Dict[str, str]]
     aiAnswers: List[Dict[str, str]]
     testId: str
     studentId: str
+    # Optional source material to grade against
+    documentId: Optional[str] = None
+    pageStart: Optional[int] = None
+    pageEnd: Optional[int] = None
 
 @app.get("/")
 def read_root():
     return {"message": "AI Test System Backend API"}
 
-@app.post("/api/extract-text")
-async def extract_text(file: UploadFile = File(...)):
-    """Extract text from an uploaded PDF file"""
+async def load_document_index(document_id: str, page_start: Optional[int], page_end: Optional[int],
+                              endpoint: Optional[str] = None, tenant: Optional[str] = None) -> ChunkIndex:
+    """Get the chunk index of a stored document, reading its text only if the index is not built yet
+    
+    The page range is checked first. Pass an endpoint and tenant to admit the
+    load; callers already holding a slot leave them out.
+    """
     try:
-        # Save the uploaded file temporarily
-        temp_file_path = f"temp_{file.filename}"
-        with open(temp_file_path, "wb") as temp_file:
-            content = await file.read()
-            temp_file.write(content)
-        
-        # Extract text from the PDF
-        extracted_text = extract_text_from_pdf(temp_file_path)
-        
-        # Clean up the temporary file
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
-        
-        return {"success": True, "text": extracted_text}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error extracting text: {str(e)}")
+        await run_in_threadpool(check_page_range, document_id, page_start, page_end)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Document not found: {document_id}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    def build():
+        return get_chunk_index(document_id, lambda: load_pages(document_id), document_chunks)
+    
+    async def load():
+        if endpoint is None:
+            return await run_in_threadpool(build)
+        # Building a cold index decompresses and vectorizes the text, so it is admitted work
+        async with admission.admit(endpoint, tenant):
+            return await run_in_threadpool(build)
+    
+    return await index_flight.run(document_id, load)
+
+def source_key(text: Optional[str], document_id: Optional[str], page_start: Optional[int], page_end: Optional[int]) -> str:
+    """Identify request text for coalescing without rehashing stored documents"""
+    if document_id:
+        return make_key(document_id, page_start, page_end)
+    return make_key(text)
+
+def provenance_key(document_key: Optional[str], page_start: Optional[int], page_end: Optional[int]) -> Optional[str]:
+    """Scope a document's provenance record to the requested pages
+    
+    Generation retires every chunk it was not given, so page ranges of the
+    same document must not share a record or they would retire each other.
+    """
+    if not document_key or (page_start is None and page_end is None):
+        return document_key
+    return f"{document_key}#pages={page_start or 1}-{page_end or ''}"
+
+@app.post("/api/extract-text")
+async def extract_text(http_request: Request, file: UploadFile = File(...), include_text: bool = True):
+    """Extract text from an uploaded PDF file and store it
+    
+    Later requests can pass the returned documentId instead of the text;
+    use ?include_text=false to skip sending the text back.
+    """
+    async with admission.admit("extract-text", tenant_of(http_request)):
+        # Save the uploaded file under a unique name; extractions run concurrently
+        fd, temp_file_path = tempfile.mkstemp(prefix="temp_", suffix=os.path.splitext(file.filename or "")[1])
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                content = await file.read()
+                temp_file.write(content)
+            
+            # Extract text from the PDF, page by page
+            pages = await run_in_threadpool(profiled(extract_pages_from_pdf), temp_file_path)
+            document_id = await run_in_threadpool(save_document, pages)
+            
+            response = {"success": True, "documentId": document_id, "pageCount": len(pages)}
+            if include_text:
+                response["text"] = "\n\n".join(pages).strip()
+            return response
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error extracting text: {str(e)}")
+        finally:
+            # Clean up the temporary file, even when extraction failed
+            if os.path.exists(temp_file_path):
+                os.remove(temp_file_path)
 
 @app.post("/api/generate-qna")
-async def generate_qna(request: QnARequest):
-    """Generate Q&A pairs from text"""
+async def generate_qna(request: QnARequest, http_request: Request):
+    """Generate Q&A pairs from text, reusing saved questions on the same material first
+    
+    Only pairs saved with this document's documentId (and a page range inside
+    the requested one) are reused; the response's documentId is the id to
+    save new pairs under.
+    """
+    if request.documentId:
+        source_id = request.documentId
+    elif request.text is not None:
+        source_id = document_hash(join_pages([request.text]))
+    else:
+        raise HTTPException(status_code=400, detail="Either text or documentId is required")
+    
+    reused = []
+    if request.subjectId and request.useQuestionBank:
+        query = " ".join([request.teacherRemark or ""] + (request.topics or []))
+        reused = [
+            {"question": pair["question"], "answer": pair["answer"]}
+            for pair in question_bank.search(
+                request.subjectId,
+                source_id,
+                query,
+                request.difficulty,
+                page_start=request.pageStart,
+                page_end=request.pageEnd,
+                limit=request.numQuestions
+            )
+        ]
+    
+    shortfall = request.numQuestions - len(reused)
+    if shortfall <= 0:
+        return {"success": True, "qnaPairs": reused, "reusedCount": len(reused), "documentId": source_id}
+    
+    # Only the questions the bank could not supply go to the LLM
+    teacher_remark = request.teacherRemark or ""
+    if request.difficulty:
+        teacher_remark = f"{teacher_remark}\nDifficulty: {request.difficulty}".strip()
+    
+    key = make_key(
+        source_key(request.text, request.documentId, request.pageStart, request.pageEnd),
+        normalize_text(teacher_remark),
+        shortfall,
+        sorted(normalize_text(topic) for topic in request.topics or []),
+        request.topK,
+        request.documentKey
+    )
+    tenant = tenant_of(http_request)
+    
+    async def generate():
+        # Only the request that starts the generation waits for a slot;
+        # identical requests join it without holding one
+        async with admission.admit("generate-qna", tenant):
+            index = None
+            if request.documentId:
+                index = await load_document_index(request.documentId, request.pageStart, request.pageEnd)
+            return await run_in_threadpool(
+                profiled(generate_qna_pairs),
+                request.text,
+                teacher_remark,
+                num_questions=shortfall,
+                topics=request.topics,
+                top_k=request.topK,
+                document_key=provenance_key(request.documentKey, request.pageStart, request.pageEnd),
+                index=index,
+                page_start=request.pageStart,
+                page_end=request.pageEnd
+            )
+    
     try:
-        qna_pairs = generate_qna_pairs(request.text, request.teacherRemark)
-        return {"success": True, "qnaPairs": qna_pairs}
+        generated = await generation_flight.run(key, generate)
+        # Drop generated questions the bank already supplied
+        seen = {normalize_text(pair["question"]) for pair in reused}
+        fresh = [pair for pair in generated if normalize_text(pair.get("question", "")) not in seen]
+        return {"success": True, "qnaPairs": reused + fresh, "reusedCount": len(reused), "documentId": source_id}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating Q&A pairs: {str(e)}")
 
+async def build_test_result(question_id: int, student_item: Dict[str, str], ai_item: Dict[str, str],
+                            endpoint: str, tenant: str, index: Optional[ChunkIndex] = None,
+                            candidates: Optional[List[int]] = None) -> TestResult:
+    """Grade one answer and build its result record as a plain dict"""
+    student_answer = student_item.get("answer", "")
+    ai_answer = ai_item.get("answer", "")
+    question_text = student_item.get("question", "")
+    
+    # Quote only the source material this question is about
+    context = index.excerpt(f"{question_text}\n{ai_answer}", candidates=candidates) if index else ""
+    
+    # Compare the answers, sharing the work with any identical grading in flight
+    key = make_key(ai_answer.strip(), student_answer.strip(), context)
+    
+    async def grade():
+        # Answers joining an identical grading in flight do not take a slot
+        async with admission.admit(endpoint, tenant):
+            return await run_in_threadpool(profiled(compare_answers), student_answer, ai_answer, context)
+    
+    analysis = await grading_flight.run(key, grade)
+    suggested_score = float(analysis["suggestedScore"])
+    
+    return {
+        "questionId": question_id,
+        "questionText": question_text,
+        "studentAnswer": student_answer,
+        "analysis": {
+            "studentAnswer": student_answer,
+            "aiAnswer": ai_answer,
+            "similarity": float(analysis["similarity"]),
+            "feedback": str(analysis["feedback"]),
+            "suggestedScore": suggested_score
+        },
+        "marks": suggested_score,
+        "totalMarks": 10.0  # Assuming total marks is 10 for each question
+    }
+
+async def iter_test_results(request: CompareRequest, endpoint: str, tenant: str,
+                            index: Optional[ChunkIndex], candidates: Optional[List[int]]):
+    """Yield result records one at a time for streaming responses"""
+    try:
+        for i, (student_item, ai_item) in enumerate(zip(request.studentAnswers, request.aiAnswers)):
+            yield await build_test_result(i + 1, student_item, ai_item, endpoint, tenant, index, candidates)
+    except Exception as e:
+        # Headers are already sent, so report the failure as a final record
+        detail = e.detail if isinstance(e, HTTPException) else str(e)
+        yield {"error": f"Error comparing answers: {detail}"}
+
 @app.post("/api/compare-answers")
-async def compare_student_answers(request: CompareRequest):
-    """Compare student answers with AI answers"""
+async def compare_student_answers(request: CompareRequest, http_request: Request, stream: bool = False):
+    """Compare student answers with AI answers
+    
+    Pass ?stream=true or Accept: application/x-ndjson to receive one result
+    per line as each answer is graded. With a documentId, each answer is graded
+    against the excerpt of that document most relevant to its question.
+    """
+    # Grading a whole class is bulk work; a single answer stays interactive.
+    # Each grading takes its own slot, so answers shared with other requests
+    # in flight never hold capacity while they wait
+    endpoint = "compare-answers-bulk" if len(request.studentAnswers) > 1 else "compare-answers"
+    tenant = tenant_of(http_request)
+    
+    index, candidates = None, None
+    if request.documentId:
+        index = await load_document_index(request.documentId, request.pageStart, request.pageEnd, endpoint, tenant)
+        # Only quote chunks from the requested pages
+        candidates = index.in_pages(request.pageStart, request.pageEnd)
+    
+    if stream or NDJSON_MEDIA_TYPE in http_request.headers.get("accept", ""):
+        return StreamingResponse(
+            aiter_ndjson(iter_test_results(request, endpoint, tenant, index, candidates)),
+            media_type=NDJSON_MEDIA_TYPE
+        )
+    
     try:
         results = []
-        
         for i, (student_item, ai_item) in enumerate(zip(request.studentAnswers, request.aiAnswers)):
-            student_answer = student_item.get("answer", "")
-            ai_answer = ai_item.get("answer", "")
-            question_text = student_item.get("question", "")
-            
-            # Compare the answers
-            analysis = compare_answers(student_answer, ai_answer)
-            
-            # Create a test result
-            result = TestResult(
-                questionId=i + 1,
-                questionText=question_text,
-                studentAnswer=student_answer,
-                analysis=TestAnalysis(
-                    studentAnswer=student_answer,
-                    aiAnswer=ai_answer,
-                    similarity=analysis["similarity"],
-                    feedback=analysis["feedback"],
-                    suggestedScore=analysis["suggestedScore"]
-                ),
-                marks=analysis["suggestedScore"],
-                totalMarks=10  # Assuming total marks is 10 for each question
-            )
-            results.append(result.dict())
+            results.append(await build_test_result(i + 1, student_item, ai_item, endpoint, tenant, index, candidates))
         
-        return results
+        return FastJSONResponse(results)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error comparing answers: {str(e)}")
 
+@app.get("/api/metrics/coalescing")
+def coalescing_metrics():
+    """Report how many generation and grading requests were coalesced"""
+    return {
+        "generation": generation_flight.stats(),
+        "grading": grading_flight.stats(),
+        "chunkIndex": index_flight.stats()
+    }
+
+@app.get("/api/metrics/admission")
+def admission_metrics():
+    """Report current load, queue depth and rejections"""
+    return admission.stats()
+
+def require_admin(request: Request):
+    """Reject callers without the ADMIN_TOKEN"""
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token or request.headers.get("x-admin-token") != admin_token:
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@app.post("/api/admin/profiling", dependencies=[Depends(require_admin)])
+def set_profiling(settings: ProfilingSettings):
+    """Profile a random fraction of requests (0 disables sampling)"""
+    profiling.sample_rate = min(max(settings.sampleRate, 0.0), 1.0)
+    return {"success": True, "sampleRate": profiling.sample_rate}
+
+@app.get("/api/admin/profiles/{profile_id}/{kind}", dependencies=[Depends(require_admin)])
+def download_profile(profile_id: str, kind: str):
+    """Download a profile artifact: cpu (pstats), summary or alloc"""
+    path = profiling.artifact_path(profile_id, kind)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile artifact not found")
+    return FileResponse(path, filename=os.path.basename(path))
+
 @app.post("/api/save-qna")
 async def save_qna(qna_pairs: List[QnAPair], subject_id: str = Form(...)):
     """Save Q&A pairs for a subject"""
@@ -159,8 +444,12 @@ async def save_qna(qna_pairs: List[QnAPair], subject_id: str = Form(...)):
         # Create data directory if it doesn't exist
         os.makedirs("data", exist_ok=True)
         
+        saved_pairs = [pair.dict() for pair in qna_pairs]
         with open(file_path, "w") as f:
-            json.dump([pair.dict() for pair in qna_pairs], f)
+            json.dump(saved_pairs, f)
+        
+        # Make the saved questions available for reuse straight away
+        question_bank.replace_subject(subject_id, saved_pairs)
         
         return {"success": True}
     except Exception as e:
@@ -5,6 +5,7 @@ from PyPDF2 import PdfReader
 import pytesseract
 from pdf2image import convert_from_path
 import ollama
+from serialization import dumps
 
 def extract_text_from_pdf(pdf_path):
     text = ""
@@ -63,10 +64,10 @@ def remove_duplicates(qna_list):
             unique_qna.append(entry)
     return unique_qna
 
-def save_qna_to_json(qna_data, output_path):
+def save_qna_to_json(payload, output_path):
     try:
-        with open(output_path, 'w', encoding='utf-8') as json_file:
-            json.dump(qna_data, json_file, indent=4, ensure_ascii=False)
+        with open(output_path, 'wb') as json_file:
+            json_file.write(payload)
     except Exception as e:
         st.error(f"Error saving JSON file: {e}")
 
@@ -108,10 +109,11 @@ def main():
                 all_qna.extend(qna_data)
             
             final_qna = remove_duplicates(all_qna)
-            save_qna_to_json(final_qna, output_file)
+            payload = dumps(final_qna, indent=True)
+            save_qna_to_json(payload, output_file)
             
             st.success(f"✅ Q&A extraction complete! {len(final_qna)} pairs generated.")
-            st.download_button("Download Q&A JSON", data=json.dumps(final_qna, indent=4), file_name="QnA.json", mime="application/json")
+            st.download_button("Download Q&A JSON", data=payload, file_name="QnA.json", mime="application/json")
             
             os.remove(pdf_path)  
 
@@ -0,0 +1,197 @@
+"""
+Request profiling module for the AI Test System.
+This module captures a CPU profile and allocation statistics for individual
+requests on demand and saves them as downloadable artifacts.
+
+Profiling is opt-in per request, either with an X-Profile header carrying
+PROFILING_TOKEN or through an admin-controlled sample rate. Without a
+PROFILING_TOKEN the header is ignored.
+
+Only one request is profiled at a time; a request that asks for a profile
+while another is being collected runs unprofiled and gets no X-Profile-Id.
+tracemalloc is process-wide, so while a profile is being collected every
+other request also pays its allocation-tracing overhead and may show up in
+the allocation report. When no profile is running, requests run exactly as
+before apart from a header lookup.
+
+Only work dispatched through profiled() is captured. A profiled request that
+joins a computation already in flight for another request (see singleflight)
+does not run that work itself, so its CPU profile is empty.
+"""
+
+import os
+import io
+import re
+import time
+import uuid
+import random
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from contextvars import ContextVar
+from typing import Any, Callable, Optional
+from starlette.concurrency import run_in_threadpool
+
+# Profile artifacts are written to this directory
+PROFILES_DIR = os.path.join("data", "profiles")
+
+# Artifact kinds and their file suffixes
+ARTIFACTS = {
+    "cpu": ".prof",
+    "summary": ".txt",
+    "alloc": ".alloc.txt",
+}
+
+PROFILE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+_active_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("active_profile", default=None)
+
+# Held while a profile is collected; tracemalloc's peak cannot be shared
+_profiling = threading.Lock()
+
+# Fraction of requests profiled without an X-Profile header, set by an admin
+sample_rate = 0.0
+
+class RequestProfile:
+    """CPU and allocation profile collected for a single request."""
+
+    def __init__(self, path: str):
+        self.id = uuid.uuid4().hex
+        self.path = path
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._stats: Optional[pstats.Stats] = None
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+
+    def start(self) -> None:
+        """Start tracing allocations; blocking, so call it from the threadpool."""
+        tracemalloc.start(10)
+        self._snapshot = tracemalloc.take_snapshot()
+
+    def run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Call func under cProfile and merge its stats into this profile."""
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.disable()
+            with self._lock:
+                if self._stats is None:
+                    self._stats = pstats.Stats(profiler)
+                else:
+                    self._stats.add(profiler)
+
+    def finish(self, base_dir: str = PROFILES_DIR) -> None:
+        """Stop collecting and write the profile artifacts to disk; blocking, like start()."""
+        elapsed = time.perf_counter() - self.started
+        try:
+            _, peak = tracemalloc.get_traced_memory()
+            allocations = tracemalloc.take_snapshot().compare_to(self._snapshot, "lineno")
+        finally:
+            tracemalloc.stop()
+
+        os.makedirs(base_dir, exist_ok=True)
+        prefix = os.path.join(base_dir, self.id)
+
+        summary = io.StringIO()
+        summary.write(f"Request: {self.path}\nWall time: {elapsed:.3f}s\n\n")
+        if self._stats is None:
+            summary.write("No profiled work ran for this request; it may have joined another request's in-flight computation.\n")
+        else:
+            self._stats.dump_stats(prefix + ARTIFACTS["cpu"])
+            self._stats.stream = summary
+            self._stats.sort_stats("cumulative").print_stats(40)
+        with open(prefix + ARTIFACTS["summary"], "w", encoding="utf-8") as f:
+            f.write(summary.getvalue())
+
+        with open(prefix + ARTIFACTS["alloc"], "w", encoding="utf-8") as f:
+            # tracemalloc is process-wide, so unprofiled concurrent requests may show up here
+            f.write(f"Request: {self.path}\nPeak traced memory: {peak / 1024:.1f} KiB\n")
+            f.write("Top allocation changes during the request:\n\n")
+            for stat in allocations[:40]:
+                f.write(f"{stat}\n")
+
+def profiled(func: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Bind a blocking function to the current request's profile, if any.
+
+    Call this on the event loop before handing func to the threadpool; the
+    returned callable profiles func in whichever thread it runs. If the call
+    is coalesced onto another request's computation, func never runs under
+    this profile.
+
+    Args:
+        func: Blocking function about to be dispatched
+
+    Returns:
+        func itself when the request is not being profiled
+    """
+    profile = _active_profile.get()
+    if profile is None:
+        return func
+
+    def run_profiled(*args: Any, **kwargs: Any) -> Any:
+        return profile.run(func, *args, **kwargs)
+    return run_profiled
+
+def artifact_path(profile_id: str, kind: str, base_dir: str = PROFILES_DIR) -> Optional[str]:
+    """
+    Locate a saved profile artifact.
+
+    Args:
+        profile_id: Id returned in the X-Profile-Id response header
+        kind: One of the ARTIFACTS keys
+
+    Returns:
+        Path to the artifact, or None if the id or kind is invalid or missing
+    """
+    if kind not in ARTIFACTS or not PROFILE_ID_PATTERN.match(profile_id):
+        return None
+    path = os.path.join(base_dir, profile_id + ARTIFACTS[kind])
+    return path if os.path.exists(path) else None
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles requests which opt in."""
+
+    def __init__(self, app, token: Optional[str] = None):
+        self.app = app
+        # X-Profile must carry this token; without one, header profiling is off
+        self.token = token if token is not None else os.getenv("PROFILING_TOKEN")
+
+    def _requested(self, scope) -> bool:
+        if self.token:
+            for name, value in scope.get("headers", ()):
+                if name == b"x-profile":
+                    return value.decode("latin-1") == self.token
+        return sample_rate > 0 and random.random() < sample_rate
+
+    async def __call__(self, scope, receive, send):
+        # A request asking for a profile while another is collected runs unprofiled
+        if scope["type"] != "http" or not self._requested(scope) or not _profiling.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope.get("path", ""))
+        try:
+            await run_in_threadpool(profile.start)
+        except BaseException:
+            _profiling.release()
+            raise
+        token = _active_profile.set(profile)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _active_profile.reset(token)
+            try:
+                await run_in_threadpool(profile.finish)
+            finally:
+                _profiling.release()
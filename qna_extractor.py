@@ -5,10 +5,12 @@ This module handles generating questions and answers from extracted text.
 """
 
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from dotenv import load_dotenv
 import openai
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from chunk_index import ChunkIndex, select_relevant_chunks
+from qna_provenance import ProvenanceStore, chunk_hash, generation_signature
 
 # Load environment variables
 load_dotenv()
@@ -16,6 +18,8 @@ load_dotenv()
 # Initialize OpenAI API
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
+GENERATION_MODEL = "gpt-3.5-turbo"
+
 def split_text(text: str, chunk_size: int = 2000) -> List[str]:
     """
     Split text into smaller chunks for processing.
@@ -35,19 +39,112 @@ def split_text(text: str, chunk_size: int = 2000) -> List[str]:
     
     return text_splitter.split_text(text)
 
-def generate_qna_pairs(text: str, teacher_remarks: str = "", num_questions: int = 10) -> List[Dict[str, str]]:
+def document_chunks(text: str) -> List[str]:
+    """
+    Split a document the way generation does, so its chunk index can be shared.
+    
+    Args:
+        text: Full document text
+        
+    Returns:
+        List of text chunks (the whole text if it is short)
+    """
+    return split_text(text) if len(text) > 4000 else [text]
+
+def _generate_chunk_qna(chunk: str, questions_per_chunk: int, teacher_remarks: str,
+                       focus_topics: str) -> Tuple[List[Dict[str, str]], bool]:
+    """
+    Ask the LLM for question-answer pairs from a single chunk.
+    
+    Args:
+        chunk: Text chunk to generate from
+        questions_per_chunk: Number of pairs to request
+        teacher_remarks: Additional guidance from the teacher
+        focus_topics: Prompt line listing the requested topics, if any
+        
+    Returns:
+        Tuple of (Q&A pairs, whether the response was parsed successfully)
+    """
+    # Prepare the prompt
+    prompt = f"""
+    Based on the following text, generate {questions_per_chunk} question-answer pairs that would be suitable for a test.
+    
+    TEXT:
+    {chunk}
+    
+    TEACHER REMARKS:
+    {teacher_remarks}
+    {focus_topics}
+    
+    Each question should test understanding of key concepts. Provide detailed answers.
+    Format your response as a JSON array with 'question' and 'answer' fields for each pair.
+    Example: [{{"question": "What is X?", "answer": "X is Y."}}]
+    """
+    
+    # Call OpenAI API
+    response = openai.chat.completions.create(
+        model=GENERATION_MODEL,
+        messages=[
+            {"role": "system", "content": "You are an AI assistant that generates educational test questions and answers."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.7,
+        max_tokens=2000
+    )
+    
+    # Parse the response
+    response_text = response.choices[0].message.content.strip()
+    
+    # Extract the JSON part (assuming the AI might add extra text)
+    import json
+    import re
+    
+    # Find anything that looks like a JSON array
+    json_match = re.search(r'\[.*\]', response_text, re.DOTALL)
+    
+    if json_match:
+        try:
+            qna_pairs = json.loads(json_match.group())
+            return qna_pairs, True
+        except json.JSONDecodeError:
+            # If JSON parsing fails, use a basic fallback
+            return [{
+                "question": "Error parsing generated questions. How would you improve this system?",
+                "answer": "The system could be improved by enhancing the Q&A generation algorithm and implementing better error handling."
+            }], False
+    else:
+        # Fallback if no JSON-like structure is found
+        return [{
+            "question": "No structured Q&A could be generated. What might be a key concept from the text?",
+            "answer": "Please review the text manually to identify key concepts as the automated extraction was unsuccessful."
+        }], False
+
+def generate_qna_pairs(text: Optional[str], teacher_remarks: str = "", num_questions: int = 10,
+                       topics: Optional[List[str]] = None, top_k: Optional[int] = None,
+                       document_key: Optional[str] = None, index: Optional[ChunkIndex] = None,
+                       page_start: Optional[int] = None, page_end: Optional[int] = None) -> List[Dict[str, str]]:
     """
     Generate question-answer pairs from the provided text.
     
+    When teacher remarks or topics are given, only the chunks most relevant
+    to them are sent to the LLM. When a document key is given, pairs from
+    chunks unchanged since the previous revision of that document are reused.
+    
     Args:
-        text: Text to generate questions and answers from
+        text: Text to generate questions and answers from (unused when index is given)
         teacher_remarks: Additional guidance from the teacher
         num_questions: Number of questions to generate
+        topics: Optional list of topics to focus on
+        top_k: Maximum number of chunks to use for targeted generation
+        document_key: Stable identifier for the document across revisions
+        index: Chunk index of a stored document to take the chunks from
+        page_start: First page to use from the indexed document
+        page_end: Last page to use from the indexed document
         
     Returns:
         List of dictionaries containing questions and answers
     """
-    if not text:
+    if not text and index is None:
         return []
     
     if not os.getenv("OPENAI_API_KEY"):
@@ -60,65 +157,49 @@ def generate_qna_pairs(text: str, teacher_remarks: str = "", num_questions: int
         ]
     
     try:
-        # Split text into chunks if it's too long
-        chunks = split_text(text) if len(text) > 4000 else [text]
+        if index is not None:
+            # Stored documents are already split; take the chunks on the requested pages
+            candidates = index.in_pages(page_start, page_end)
+            all_chunks = [index.chunks[i] for i in candidates]
+        else:
+            # Split text into chunks if it's too long
+            candidates = None
+            all_chunks = document_chunks(text)
+        if not all_chunks:
+            return []
+        
+        # Only send the material the remarks or topics actually ask about
+        chunks = select_relevant_chunks(all_chunks, teacher_remarks, topics, top_k, index, candidates)
+        
+        focus_topics = f"FOCUS TOPICS: {', '.join(topics)}" if topics else ""
         
         all_qna_pairs = []
         questions_per_chunk = max(1, num_questions // len(chunks))
         
-        for chunk in chunks:
-            # Prepare the prompt
-            prompt = f"""
-            Based on the following text, generate {questions_per_chunk} question-answer pairs that would be suitable for a test.
-            
-            TEXT:
-            {chunk}
-            
-            TEACHER REMARKS:
-            {teacher_remarks}
-            
-            Each question should test understanding of key concepts. Provide detailed answers.
-            Format your response as a JSON array with 'question' and 'answer' fields for each pair.
-            Example: [{{"question": "What is X?", "answer": "X is Y."}}]
-            """
-            
-            # Call OpenAI API
-            response = openai.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are an AI assistant that generates educational test questions and answers."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=2000
-            )
-            
-            # Parse the response
-            response_text = response.choices[0].message.content.strip()
-            
-            # Extract the JSON part (assuming the AI might add extra text)
-            import json
-            import re
-            
-            # Find anything that looks like a JSON array
-            json_match = re.search(r'\[.*\]', response_text, re.DOTALL)
-            
-            if json_match:
-                try:
-                    qna_pairs = json.loads(json_match.group())
-                    all_qna_pairs.extend(qna_pairs)
-                except json.JSONDecodeError:
-                    # If JSON parsing fails, use a basic fallback
-                    all_qna_pairs.append({
-                        "question": "Error parsing generated questions. How would you improve this system?",
-                        "answer": "The system could be improved by enhancing the Q&A generation algorithm and implementing better error handling."
-                    })
-            else:
-                # Fallback if no JSON-like structure is found
-                all_qna_pairs.append({
-                    "question": "No structured Q&A could be generated. What might be a key concept from the text?",
-                    "answer": "Please review the text manually to identify key concepts as the automated extraction was unsuccessful."
-                })
+        # Reuse pairs from chunks that are unchanged since the last revision
+        store = ProvenanceStore(document_key) if document_key else None
+        signature = generation_signature(teacher_remarks, topics or [], GENERATION_MODEL)
+        if store:
+            retired = store.retire(chunk_hash(chunk) for chunk in all_chunks)
+            if retired:
+                print(f"Retired Q&A pairs from {retired} removed chunk(s) of {document_key}")
+        
+        try:
+            for chunk in chunks:
+                digest = chunk_hash(chunk)
+                cached = store.get(digest, signature, questions_per_chunk) if store else None
+                if cached is not None:
+                    all_qna_pairs.extend(cached)
+                    continue
+                
+                qna_pairs, parsed = _generate_chunk_qna(chunk, questions_per_chunk, teacher_remarks, focus_topics)
+                all_qna_pairs.extend(qna_pairs)
+                if store and parsed:
+                    store.put(digest, signature, questions_per_chunk, qna_pairs)
+        finally:
+            # Keep whatever was generated even if a later chunk failed
+            if store:
+                store.save()
                 
         return all_qna_pairs[:num_questions]  # Limit to requested number of questions
         
@@ -0,0 +1,135 @@
+"""
+Q&A provenance module for the AI Test System.
+This module records which source chunk each generated Q&A pair came from, so
+that revised documents only need new or changed chunks regenerated.
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from typing import List, Dict, Any, Optional, Iterable, Set
+
+# Provenance records are stored per document key in this directory
+PROVENANCE_DIR = os.path.join("data", "provenance")
+
+# One lock per record file; generations for the same document run in parallel threads
+_file_locks: Dict[str, threading.Lock] = {}
+_file_locks_guard = threading.Lock()
+
+def _lock_for(path: str) -> threading.Lock:
+    with _file_locks_guard:
+        return _file_locks.setdefault(path, threading.Lock())
+
+def chunk_hash(chunk: str) -> str:
+    """
+    Compute the content hash of a text chunk.
+
+    Args:
+        chunk: Chunk produced by split_text()
+
+    Returns:
+        Hex SHA-256 digest of the chunk
+    """
+    return hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+
+def generation_signature(*params: Any) -> str:
+    """
+    Fingerprint the generation parameters that affect a chunk's Q&A pairs.
+
+    Args:
+        params: JSON-serializable parameters (remarks, topics, model, ...)
+
+    Returns:
+        Hex SHA-256 digest of the parameters
+    """
+    payload = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class ProvenanceStore:
+    """Chunk-level record of generated Q&A pairs for one logical document."""
+
+    def __init__(self, document_key: str, base_dir: str = PROVENANCE_DIR):
+        self.document_key = document_key
+        key_hash = hashlib.sha256(document_key.encode("utf-8")).hexdigest()[:32]
+        self.path = os.path.join(base_dir, f"{key_hash}.json")
+        self._lock = _lock_for(self.path)
+
+        # Changes made by this run, merged into the latest record on save()
+        self._updates: Dict[str, Dict[str, Any]] = {}
+        self._current: Optional[Set[str]] = None
+
+        with self._lock:
+            self.chunks = self._read()
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f).get("chunks", {})
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Error loading provenance for {self.document_key}, starting fresh: {e}")
+            return {}
+
+    def get(self, digest: str, signature: str, count: int) -> Optional[List[Dict[str, str]]]:
+        """
+        Look up reusable Q&A pairs for a chunk.
+
+        Args:
+            digest: Chunk hash from chunk_hash()
+            signature: Generation signature the pairs must have been made with
+            count: Number of pairs needed from this chunk
+
+        Returns:
+            Up to count pairs, or None if the chunk must be regenerated
+        """
+        entry = self.chunks.get(digest)
+        if not entry or entry.get("signature") != signature or entry.get("requested", 0) < count:
+            return None
+        return entry["pairs"][:count]
+
+    def put(self, digest: str, signature: str, count: int, pairs: List[Dict[str, str]]) -> None:
+        """Record the Q&A pairs generated from a chunk."""
+        entry = {"signature": signature, "requested": count, "pairs": pairs}
+        self.chunks[digest] = entry
+        self._updates[digest] = entry
+
+    def retire(self, current_digests: Iterable[str]) -> int:
+        """
+        Drop pairs whose source chunk is no longer part of the document.
+
+        Args:
+            current_digests: Hashes of every chunk in the current revision
+
+        Returns:
+            Number of chunks retired
+        """
+        current = set(current_digests)
+        self._current = current
+        stale = [digest for digest in self.chunks if digest not in current]
+        for digest in stale:
+            del self.chunks[digest]
+        return len(stale)
+
+    def save(self) -> None:
+        """Merge this run's changes into the stored record and write it atomically."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._lock:
+            # Another run may have saved since we loaded; merge rather than overwrite
+            chunks = self._read()
+            if self._current is not None:
+                chunks = {digest: entry for digest, entry in chunks.items() if digest in self._current}
+            chunks.update(self._updates)
+
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump({"documentKey": self.document_key, "chunks": chunks}, f)
+                os.replace(temp_path, self.path)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+            self.chunks = chunks
@@ -0,0 +1,172 @@
+"""
+Question bank module for the AI Test System.
+This module keeps an inverted index over every saved Q&A pair so that
+generation can reuse matching questions before asking the LLM for more.
+
+Pairs are only reused for the document they were generated from: each saved
+pair records its source documentId (and page range), and searches are
+restricted to that source. Pairs saved without a documentId are never reused.
+"""
+
+import os
+import re
+import glob
+import json
+import math
+from collections import defaultdict
+from typing import List, Dict, Any, Optional, Set
+
+# Saved Q&A sets live in this directory as <subject>_qna.json
+DATA_DIR = "data"
+
+STOP_WORDS = {
+    "the", "and", "for", "are", "but", "not", "you", "all", "any", "can", "her", "was", "one",
+    "our", "out", "has", "him", "his", "how", "its", "who", "why", "what", "when", "where",
+    "which", "with", "from", "that", "this", "these", "those", "into", "about", "than", "then",
+    "them", "they", "their", "there", "been", "being", "have", "does", "did", "will", "would",
+    "should", "could", "also", "such", "some", "more", "most", "other", "each", "only", "over",
+    "question", "questions", "answer", "answers", "focus", "please", "make", "include",
+    "generate", "create", "write", "give", "hard", "easy", "medium", "difficult", "simple",
+    "class", "grade", "level", "test", "exam", "quiz", "short", "long", "detailed",
+}
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stop words or very short words."""
+    return [t for t in re.findall(r"[a-z0-9]+", (text or "").lower()) if len(t) > 2 and t not in STOP_WORDS]
+
+class QuestionBank:
+    """Inverted index over saved Q&A pairs, searchable by subject, difficulty and topic."""
+
+    def __init__(self, data_dir: str = DATA_DIR):
+        self.data_dir = data_dir
+        self.entries: Dict[int, Dict[str, Any]] = {}
+        self.postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self.by_subject: Dict[str, Set[int]] = defaultdict(set)
+        self._next_id = 0
+        self.load()
+
+    def load(self) -> None:
+        """Index every saved Q&A file in the data directory."""
+        for path in glob.glob(os.path.join(self.data_dir, "*_qna.json")):
+            subject_id = os.path.basename(path)[:-len("_qna.json")]
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.replace_subject(subject_id, json.load(f))
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Error indexing question bank file {path}: {e}")
+
+    def replace_subject(self, subject_id: str, pairs: List[Dict[str, Any]]) -> None:
+        """
+        Re-index a subject after its saved Q&A set changed.
+
+        Args:
+            subject_id: Subject the pairs were saved under
+            pairs: Full saved Q&A set for the subject
+        """
+        for entry_id in self.by_subject.pop(subject_id, set()):
+            entry = self.entries.pop(entry_id)
+            for token in entry["_terms"]:
+                self.postings[token].pop(entry_id, None)
+                if not self.postings[token]:
+                    del self.postings[token]
+
+        for pair in pairs:
+            if not pair.get("question") or not pair.get("answer"):
+                continue
+            entry_id = self._next_id
+            self._next_id += 1
+
+            topics = [t.lower() for t in pair.get("topics") or []]
+            # Topic and question words count more than words from the answer
+            terms = defaultdict(int)
+            for token in tokenize(" ".join(topics)):
+                terms[token] += 3
+            for token in tokenize(pair["question"]):
+                terms[token] += 2
+            for token in tokenize(pair["answer"]):
+                terms[token] += 1
+
+            self.entries[entry_id] = {
+                "question": pair["question"],
+                "answer": pair["answer"],
+                "difficulty": (pair.get("difficulty") or "").lower() or None,
+                "topics": topics,
+                "subject": subject_id,
+                "documentId": pair.get("documentId"),
+                "pageStart": pair.get("pageStart"),
+                "pageEnd": pair.get("pageEnd"),
+                "_terms": dict(terms),
+            }
+            self.by_subject[subject_id].add(entry_id)
+            for token, weight in terms.items():
+                self.postings[token][entry_id] = weight
+
+    def _from_source(self, entry: Dict[str, Any], document_id: str,
+                     page_start: Optional[int], page_end: Optional[int]) -> bool:
+        # The saved pair's pages must lie inside the requested range
+        if entry["documentId"] != document_id:
+            return False
+        if page_start is None and page_end is None:
+            return True
+        saved_start = entry["pageStart"] or 1
+        saved_end = entry["pageEnd"]
+        if saved_start < (page_start or 1):
+            return False
+        return page_end is None or (saved_end is not None and saved_end <= page_end)
+
+    def search(self, subject_id: str, document_id: Optional[str], query: str = "",
+               difficulty: Optional[str] = None, page_start: Optional[int] = None,
+               page_end: Optional[int] = None, limit: int = 10,
+               min_coverage: float = 0.5) -> List[Dict[str, Any]]:
+        """
+        Find saved Q&A pairs generated from the same material.
+
+        Args:
+            subject_id: Only pairs saved under this subject are considered
+            document_id: Source document the pairs must have been generated from
+            query: Topics and/or teacher remarks to match; empty matches any pair
+            difficulty: Optional difficulty the pairs must have
+            page_start: First page of the requested range, if any
+            page_end: Last page of the requested range, if any
+            limit: Maximum number of pairs to return
+            min_coverage: Fraction of query terms a pair must contain
+
+        Returns:
+            Best matching pairs, highest score first (saved order for an empty query)
+        """
+        if not document_id:
+            return []
+
+        difficulty = difficulty.lower() if difficulty else None
+        candidates = {
+            entry_id for entry_id in self.by_subject.get(subject_id, ())
+            if self._from_source(self.entries[entry_id], document_id, page_start, page_end)
+            and (difficulty is None or self.entries[entry_id]["difficulty"] == difficulty)
+        }
+        query_terms = set(tokenize(query))
+        if not query_terms:
+            ranked = sorted(candidates)
+        else:
+            scores: Dict[int, float] = defaultdict(float)
+            matched: Dict[int, int] = defaultdict(int)
+            for token in query_terms:
+                postings = self.postings.get(token, {})
+                if not postings:
+                    continue
+                idf = math.log(1 + len(self.entries) / len(postings))
+                for entry_id, weight in postings.items():
+                    if entry_id in candidates:
+                        scores[entry_id] += weight * idf
+                        matched[entry_id] += 1
+
+            needed = math.ceil(len(query_terms) * min_coverage)
+            ranked = sorted(
+                (entry_id for entry_id in scores if matched[entry_id] >= needed),
+                key=lambda entry_id: scores[entry_id],
+                reverse=True
+            )
+
+        return [
+            {key: value for key, value in self.entries[entry_id].items() if not key.startswith("_")}
+            for entry_id in ranked[:limit]
+        ]
@@ -0,0 +1,52 @@
+"""
+Serialization module for the AI Test System.
+This module provides fast JSON encoding and NDJSON streaming for result-heavy
+responses, using orjson when it is installed. It has no web framework imports
+so the standalone Streamlit tools can use it too.
+"""
+
+import json
+from typing import Any, AsyncIterable, AsyncIterator, Iterable, Iterator
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+def dumps(obj: Any, indent: bool = False) -> bytes:
+    """
+    Serialize an object to UTF-8 JSON bytes.
+
+    Args:
+        obj: JSON-serializable object
+        indent: Pretty-print for human consumption (downloads, files)
+
+    Returns:
+        Encoded JSON
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    if indent:
+        # Match orjson's two-space layout so files look the same either way
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def iter_ndjson(records: Iterable[Any]) -> Iterator[bytes]:
+    """
+    Encode records as newline-delimited JSON, one record at a time.
+
+    Args:
+        records: Iterable of JSON-serializable records
+
+    Yields:
+        One encoded line per record
+    """
+    for record in records:
+        yield dumps(record) + b"\n"
+
+async def aiter_ndjson(records: AsyncIterable[Any]) -> AsyncIterator[bytes]:
+    """Async counterpart of iter_ndjson() for records produced by coroutines."""
+    async for record in records:
+        yield dumps(record) + b"\n"
@@ -0,0 +1,99 @@
+"""
+Request coalescing module for the AI Test System.
+This module makes concurrent identical requests share one in-flight
+computation instead of each repeating the same expensive LLM work.
+
+Only the caller that starts a computation runs its setup (such as waiting
+for an admission slot); callers that join it wait on the result alone.
+"""
+
+import re
+import json
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict
+from starlette.concurrency import run_in_threadpool
+
+def normalize_text(value: str) -> str:
+    """Collapse whitespace and case so trivially different inputs share a key."""
+    return re.sub(r"\s+", " ", value or "").strip().lower()
+
+def make_key(*parts: Any) -> str:
+    """
+    Build a coalescing key from JSON-serializable parts.
+
+    Args:
+        parts: Values that fully determine the result of the computation
+
+    Returns:
+        Hex SHA-256 digest of the parts
+    """
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key onto one computation."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.calls = 0
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Run a blocking function in the threadpool, or join an identical call already running.
+
+        Args:
+            key: Coalescing key from make_key()
+            func: Blocking function to run
+            args: Positional arguments for func
+            kwargs: Keyword arguments for func
+
+        Returns:
+            The result of func, shared by every caller with the same key
+        """
+        return await self.run(key, lambda: run_in_threadpool(func, *args, **kwargs))
+
+    async def run(self, key: str, start: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Start a coroutine, or join an identical one already in flight.
+
+        Args:
+            key: Coalescing key from make_key()
+            start: Creates the coroutine; only called if nothing is in flight for key
+
+        Returns:
+            The coroutine's result, shared by every caller with the same key
+        """
+        self.calls += 1
+        task = self._inflight.get(key)
+
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.executed += 1
+            task = asyncio.ensure_future(start())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+
+        # Shield so one caller disconnecting does not cancel the work for the others
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved in case every waiter went away
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get coalescing counters for this flight group."""
+        return {
+            "calls": self.calls,
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "inFlight": len(self._inflight),
+            "coalescedRatio": round(self.coalesced / self.calls, 4) if self.calls else 0.0
+        }
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from admission import AdmissionController, EndpointPolicy, INTERACTIVE, BULK
+
+
+def make_controller(**kwargs):
+    policies = {
+        "interactive": EndpointPolicy(limit=4, queue_size=4, priority=INTERACTIVE),
+        "bulk": EndpointPolicy(limit=4, queue_size=4, priority=BULK),
+    }
+    options = {"max_concurrency": 1, "tenant_limit": 4, "queue_timeout": 1.0}
+    options.update(kwargs)
+    return AdmissionController(policies, **options)
+
+
+def test_interactive_requests_run_before_queued_bulk():
+    async def scenario():
+        controller = make_controller()
+        order = []
+        holder = await controller.acquire("bulk", "a")
+
+        async def job(endpoint, name):
+            async with controller.admit(endpoint, name):
+                order.append(name)
+
+        tasks = [asyncio.create_task(job("bulk", "bulk-1"))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(job("interactive", "interactive-1")))
+        await asyncio.sleep(0)
+
+        controller.release(holder)
+        await asyncio.gather(*tasks)
+        return order, controller.stats()
+
+    order, stats = asyncio.run(scenario())
+    assert order == ["interactive-1", "bulk-1"]
+    assert stats["active"] == 0 and stats["queued"] == 0
+
+
+def test_tenant_limit_lets_other_tenants_through():
+    async def scenario():
+        controller = make_controller(max_concurrency=4, tenant_limit=1)
+        first = await controller.acquire("bulk", "teacher-a")
+
+        blocked = asyncio.create_task(controller.acquire("bulk", "teacher-a"))
+        other = await asyncio.wait_for(controller.acquire("bulk", "teacher-b"), timeout=0.5)
+        await asyncio.sleep(0)
+        assert not blocked.done()
+
+        controller.release(first)
+        second = await asyncio.wait_for(blocked, timeout=0.5)
+        controller.release(second)
+        controller.release(other)
+        return controller.stats()
+
+    assert asyncio.run(scenario())["active"] == 0
+
+
+def test_full_queue_is_rejected_with_429():
+    async def scenario():
+        controller = make_controller()
+        controller.policies["bulk"].queue_size = 1
+        holder = await controller.acquire("bulk", "a")
+        waiter = asyncio.create_task(controller.acquire("bulk", "a"))
+        await asyncio.sleep(0)
+
+        with pytest.raises(HTTPException) as rejected:
+            await controller.acquire("bulk", "a")
+
+        controller.release(holder)
+        controller.release(await waiter)
+        return rejected.value, controller.stats()
+
+    error, stats = asyncio.run(scenario())
+    assert error.status_code == 429
+    assert stats["rejected"]["queueFull"] == 1
+
+
+def test_queue_timeout_is_rejected_with_503():
+    async def scenario():
+        controller = make_controller(queue_timeout=0.05)
+        holder = await controller.acquire("interactive", "a")
+
+        with pytest.raises(HTTPException) as rejected:
+            await controller.acquire("interactive", "b")
+
+        controller.release(holder)
+        return rejected.value, controller.stats()
+
+    error, stats = asyncio.run(scenario())
+    assert error.status_code == 503
+    assert stats["rejected"]["queueTimeout"] == 1
+    assert stats["queued"] == 0 and stats["active"] == 0
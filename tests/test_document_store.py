@@ -0,0 +1,61 @@
+import threading
+
+import pytest
+
+from document_store import check_page_range, document_exists, load_pages, load_text, page_count, save_document
+
+
+PAGES = ["Page one text.", "Page two text.", "Page three text.", "Page four text."]
+
+
+def test_page_ranges_round_trip(tmp_path):
+    document_id = save_document(PAGES, base_dir=str(tmp_path))
+
+    assert document_exists(document_id, base_dir=str(tmp_path))
+    assert page_count(document_id, base_dir=str(tmp_path)) == 4
+    assert load_text(document_id, base_dir=str(tmp_path)) == "\n\n".join(PAGES)
+    assert load_text(document_id, 2, 3, base_dir=str(tmp_path)) == "Page two text.\n\nPage three text."
+    assert load_pages(document_id, 4, None, base_dir=str(tmp_path)) == ["Page four text."]
+    assert load_pages(document_id, None, 1, base_dir=str(tmp_path)) == ["Page one text."]
+    # Saving the same text again returns the same id
+    assert save_document(PAGES, base_dir=str(tmp_path)) == document_id
+
+
+@pytest.mark.parametrize("page_start,page_end", [(0, 2), (3, 5), (3, 2)])
+def test_out_of_range_pages_are_rejected(tmp_path, page_start, page_end):
+    document_id = save_document(PAGES, base_dir=str(tmp_path))
+
+    with pytest.raises(ValueError):
+        load_text(document_id, page_start, page_end, base_dir=str(tmp_path))
+    with pytest.raises(ValueError):
+        check_page_range(document_id, page_start, page_end, base_dir=str(tmp_path))
+
+
+def test_unknown_documents_are_rejected(tmp_path):
+    with pytest.raises(KeyError):
+        load_text("0" * 64, base_dir=str(tmp_path))
+    with pytest.raises(KeyError):
+        load_text("../secrets", base_dir=str(tmp_path))
+    assert not document_exists("0" * 64, base_dir=str(tmp_path))
+
+
+def test_concurrent_saves_of_the_same_document(tmp_path):
+    pages = [f"Page {i} " * 500 for i in range(20)]
+    ids, errors = [], []
+
+    def save():
+        try:
+            ids.append(save_document(pages, base_dir=str(tmp_path)))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=save) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(set(ids)) == 1
+    assert load_pages(ids[0], base_dir=str(tmp_path)) == pages
+    assert sorted(path.suffix for path in tmp_path.iterdir()) == [".json", ".pages"]
@@ -0,0 +1,61 @@
+import threading
+
+from qna_provenance import ProvenanceStore, chunk_hash, generation_signature
+
+
+SIGNATURE = generation_signature("remarks", [], "model")
+
+
+def pairs_for(chunk):
+    return [{"question": f"What is in {chunk}?", "answer": chunk}]
+
+
+def save_revision(base_dir, chunks):
+    store = ProvenanceStore("physics-notes", base_dir=str(base_dir))
+    store.retire(chunk_hash(chunk) for chunk in chunks)
+    for chunk in chunks:
+        store.put(chunk_hash(chunk), SIGNATURE, 1, pairs_for(chunk))
+    store.save()
+
+
+def test_unchanged_chunks_are_reused_after_one_chunk_edit(tmp_path):
+    save_revision(tmp_path, ["chunk one", "chunk two", "chunk three"])
+
+    store = ProvenanceStore("physics-notes", base_dir=str(tmp_path))
+    revised = ["chunk one", "chunk two, revised", "chunk three"]
+    store.retire(chunk_hash(chunk) for chunk in revised)
+
+    assert store.get(chunk_hash("chunk one"), SIGNATURE, 1) == pairs_for("chunk one")
+    assert store.get(chunk_hash("chunk three"), SIGNATURE, 1) == pairs_for("chunk three")
+    assert store.get(chunk_hash("chunk two, revised"), SIGNATURE, 1) is None
+    # Different generation parameters must not reuse the pairs
+    assert store.get(chunk_hash("chunk one"), generation_signature("other", [], "model"), 1) is None
+
+
+def test_removed_chunks_are_retired(tmp_path):
+    save_revision(tmp_path, ["chunk one", "chunk two", "chunk three"])
+
+    store = ProvenanceStore("physics-notes", base_dir=str(tmp_path))
+    assert store.retire([chunk_hash("chunk one"), chunk_hash("chunk three")]) == 1
+    store.save()
+
+    reloaded = ProvenanceStore("physics-notes", base_dir=str(tmp_path))
+    assert set(reloaded.chunks) == {chunk_hash("chunk one"), chunk_hash("chunk three")}
+
+
+def test_concurrent_saves_merge_instead_of_overwriting(tmp_path):
+    chunks = [f"chunk {i}" for i in range(8)]
+    # Every store loads before any of them saves
+    stores = [ProvenanceStore("physics-notes", base_dir=str(tmp_path)) for _ in chunks]
+    for store, chunk in zip(stores, chunks):
+        store.put(chunk_hash(chunk), SIGNATURE, 1, pairs_for(chunk))
+
+    threads = [threading.Thread(target=store.save) for store in stores]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    reloaded = ProvenanceStore("physics-notes", base_dir=str(tmp_path))
+    assert set(reloaded.chunks) == {chunk_hash(chunk) for chunk in chunks}
+    assert [path.name for path in tmp_path.iterdir() if path.suffix == ".tmp"] == []
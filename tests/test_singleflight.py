@@ -0,0 +1,66 @@
+import asyncio
+import threading
+import time
+
+import httpx
+from starlette.concurrency import run_in_threadpool
+
+import main
+from admission import AdmissionController, EndpointPolicy
+from singleflight import SingleFlight
+
+
+def test_identical_calls_share_one_execution_and_one_slot():
+    async def scenario():
+        flight = SingleFlight("test")
+        controller = AdmissionController({"work": EndpointPolicy(limit=4, queue_size=8)}, max_concurrency=4)
+        executions = []
+        active = []
+
+        def work():
+            executions.append(1)
+            active.append(controller.stats()["active"])
+            time.sleep(0.05)
+            return "done"
+
+        async def start():
+            async with controller.admit("work", "a"):
+                return await run_in_threadpool(work)
+
+        results = await asyncio.gather(*(flight.run("key", start) for _ in range(6)))
+        return results, executions, active, flight.stats(), controller.stats()
+
+    results, executions, active, stats, admission_stats = asyncio.run(scenario())
+    assert results == ["done"] * 6
+    assert len(executions) == 1
+    assert active == [1]
+    assert stats["executed"] == 1 and stats["coalesced"] == 5
+    assert admission_stats["active"] == 0
+
+
+def test_identical_generate_requests_run_once(monkeypatch):
+    lock = threading.Lock()
+    calls = []
+    active = []
+
+    def fake_generate(text, teacher_remarks="", num_questions=10, **kwargs):
+        with lock:
+            calls.append(text)
+            active.append(main.admission.stats()["endpoints"]["generate-qna"]["active"])
+        time.sleep(0.2)
+        return [{"question": "What is inertia?", "answer": "Resistance to changes in motion."}]
+
+    monkeypatch.setattr(main, "generate_qna_pairs", fake_generate)
+    payload = {"text": "Newton's first law describes inertia.", "numQuestions": 1, "useQuestionBank": False}
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(client.post("/api/generate-qna", json=payload) for _ in range(6)))
+
+    responses = asyncio.run(scenario())
+    assert [r.status_code for r in responses] == [200] * 6
+    assert all(r.json()["qnaPairs"][0]["question"] == "What is inertia?" for r in responses)
+    assert len(calls) == 1
+    assert active == [1]
+    assert main.admission.stats()["endpoints"]["generate-qna"]["active"] == 0
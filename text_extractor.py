@@ -9,6 +9,22 @@ from typing import Optional, List
 import PyPDF2
 from docx import Document
 
+def extract_pages_from_pdf(file_path: str) -> List[str]:
+    """
+    Extract the text of each page of a PDF file.
+    
+    Args:
+        file_path: Path to the PDF file
+        
+    Returns:
+        Extracted text of each page, in order
+    """
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        
+        # Extract text from each page
+        return [page.extract_text() for page in pdf_reader.pages]
+
 def extract_text_from_pdf(file_path: str) -> str:
     """
     Extract text from a PDF file.
@@ -19,18 +35,8 @@ def extract_text_from_pdf(file_path: str) -> str:
     Returns:
         Extracted text from the PDF
     """
-    extracted_text = ""
-    
     try:
-        with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            
-            # Extract text from each page
-            for page_num in range(len(pdf_reader.pages)):
-                page = pdf_reader.pages[page_num]
-                extracted_text += page.extract_text() + "\n\n"
-                
-        return extracted_text.strip()
+        return "\n\n".join(extract_pages_from_pdf(file_path)).strip()
     except Exception as e:
         print(f"Error extracting text from PDF: {e}")
         return f"Error extracting text: {str(e)}"